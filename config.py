@@ -9,6 +9,7 @@ load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE")
 
 # -- OpenAI API Key --
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -22,8 +23,10 @@ PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
 EMBED_MODEL = "text-embedding-3-large"
 CHAT_MODEL = "gpt-4o"
 
-# Vector dimension for text-embedding-3-large MUST be 3072
-PINECONE_VECTOR_DIM = 3072
+# Embedding dimensionality. text-embedding-3-large defaults to 3072 but
+# supports server-side reduction (e.g. 1024); the uploader and the chat path
+# both read this constant so the index and the query vectors always agree.
+PINECONE_VECTOR_DIM = int(os.getenv("PINECONE_VECTOR_DIM", 3072))
 
 # --- Sanity Checks ---
 # Ensures the script fails if a required key is missing.
@@ -1,19 +1,158 @@
-import os
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any , Generator
-from openai import OpenAI, APIError
+from typing import List, Dict, Any , AsyncGenerator
+from openai import AsyncOpenAI, APIError
 from pinecone import Pinecone, PineconeException
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase
 from neo4j.exceptions import Neo4jError
-from dotenv import load_dotenv
 import httpx
+import numpy as np
 import redis
 import json
+import zstandard as zstd
+
+from config import (
+    OPENAI_API_KEY,
+    PINECONE_API_KEY,
+    PINECONE_INDEX_NAME,
+    PINECONE_VECTOR_DIM,
+    NEO4J_URI,
+    NEO4J_USER,
+    NEO4J_PASSWORD,
+    NEO4J_DATABASE,
+)
 
 # --- 1. Basic Setup ---
-load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Retrieved context above this size (~4k tokens) gets condensed with an extra
+# summarization call; anything smaller is passed to the answer model as-is.
+SUMMARY_CHAR_THRESHOLD = 16000
+
+# Shared zstd codecs for the embedding cache; level 1 costs microseconds and
+# roughly halves the size of float32 vectors.
+_zstd_compressor = zstd.ZstdCompressor(level=1)
+_zstd_decompressor = zstd.ZstdDecompressor()
+
+
+def _quantize_embedding(embedding: List[float]) -> bytes:
+    """Packs a vector as one float32 scale followed by int8 components.
+
+    Per-vector symmetric quantization loses ~0.3% cosine similarity but cuts
+    the payload 4x versus float32. Only the cache uses this representation;
+    queries still send the dequantized float32 vector to Pinecone.
+    """
+    vec = np.asarray(embedding, dtype=np.float32)
+    scale = np.float32(np.max(np.abs(vec)) / 127.0) if vec.size else np.float32(0.0)
+    if scale > 0:
+        quantized = np.round(vec / scale).astype(np.int8)
+    else:
+        quantized = vec.astype(np.int8)
+    return scale.tobytes() + quantized.tobytes()
+
+
+def _dequantize_embedding(buf: bytes) -> List[float]:
+    """Restores a float32 vector from the scale + int8 packing above."""
+    scale = np.frombuffer(buf[:4], dtype=np.float32)[0]
+    return (np.frombuffer(buf[4:], dtype=np.int8).astype(np.float32) * scale).tolist()
+
+# Built once at import; the multi-KB prompt literal is not re-created per call.
+_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """You are 'VietBot', a meticulous and expert AI travel planner for Vietnam. Your task is to follow a strict reasoning process to provide the most accurate and helpful answer possible, based **exclusively** on the provided context.
+
+### Step 1: Internal Thought Process
+
+First, you must reason through the user's request by completing the following steps inside `<thinking>` tags. This is your private workspace.
+
+<thinking>
+**1. User's Goal:** [Identify the user's primary intent in one clear sentence.]
+**2. Key Information & Constraints:** [Extract all key entities, locations, durations, preferences (e.g., 'romantic'), or other constraints from the user's query.]
+**3. Context Analysis:** [Analyze the provided 'CONTEXT SUMMARY'. List the specific pieces of information that directly address the user's goal and constraints.]
+**4. Sufficiency Check:** [Based on the analysis, explicitly state whether the context is sufficient to fully answer the query. If not, identify exactly what information is missing.]
+**5. Plan:** [Based on the available information, outline a clear, step-by-step plan for constructing the final answer.]
+</thinking>
+
+### Step 2: Final Answer to the User
+
+After your thought process, provide the final answer to the user inside `<answer>` tags.
+
+### Rules for the Final Answer:
+-   The answer must be based **only** on your 'Plan' from the `<thinking>` block.
+-   If the context was insufficient, state clearly what you can answer and what information you couldn't find. **Do not make up information.**
+-   Do not mention your thought process or the context summary in the final answer. Speak directly to the user.
+-   Format the answer for clarity using Markdown (lists, bold text).
+-   Cite sources by including the node ID in parentheses, like `Hoi An (town_hoi_an)`.
+-   Maintain a friendly, expert tone.
+""",
+}
+
+
+class _EmbedBatcher:
+    """Coalesces concurrent embedding requests into single OpenAI calls.
+
+    Requests that arrive within a short window (or until the batch fills) are
+    sent as one `embeddings.create` call, amortizing the fixed per-request
+    HTTP overhead across all waiters.
+    """
+
+    def __init__(self, openai_client, model: str, dimensions: int,
+                 max_batch: int = 64, window: float = 0.01):
+        self.openai_client = openai_client
+        self.model = model
+        self.dimensions = dimensions
+        self.max_batch = max_batch
+        self.window = window
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker = None
+
+    async def embed(self, text: str) -> List[float]:
+        """Submit one text and wait for its embedding from a shared batch call."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            # Started lazily so the worker binds to the running event loop.
+            self._worker = loop.create_task(self._drain_loop())
+        future = loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _drain_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                # dimensions must match the Pinecone index dimension or every
+                # query against the index fails with a mismatch.
+                resp = await self.openai_client.embeddings.create(
+                    model=self.model,
+                    input=[text for text, _ in batch],
+                    dimensions=self.dimensions,
+                )
+                for (_, future), data in zip(batch, resp.data):
+                    if not future.done():
+                        future.set_result(data.embedding)
+                if len(resp.data) < len(batch):
+                    raise RuntimeError(
+                        f"Embedding response covered {len(resp.data)} of {len(batch)} inputs."
+                    )
+            except Exception as e:
+                # Reject every unresolved waiter: embed() has no timeout, so a
+                # stranded future — whether from an unexpected exception or a
+                # short response — would hang its request forever.
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
 
 class HybridRAG:
     """A class for a hybrid RAG system using OpenAI, Pinecone, and Neo4j."""
@@ -21,96 +160,148 @@ class HybridRAG:
     def __init__(self):
         try:
             # OpenAI
-            http_client = httpx.Client(trust_env=False)
-            self.openai_client = OpenAI(
-                api_key=os.getenv("OPENAI_API_KEY"),
-                http_client=http_client
+            # Tuned pool: keep connections alive across requests and let HTTP/2
+            # multiplex concurrent embedding/chat calls over one TLS session.
+            # Sized for streaming: each in-flight answer holds its connection
+            # for seconds, so the caps sit well above expected concurrency.
+            http_client = httpx.AsyncClient(
+                trust_env=False,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=200,
+                    max_keepalive_connections=100,
+                    keepalive_expiry=600,
+                ),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            )
+            self.openai_client = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                http_client=http_client,
+                max_retries=2
             )
             self.embed_model = "text-embedding-3-large"
             self.chat_model = "gpt-4o-mini"
+            self.embed_batcher = _EmbedBatcher(
+                self.openai_client, self.embed_model, dimensions=PINECONE_VECTOR_DIM
+            )
+
+            # ---Connect to Redis ---
+            # Connected before Pinecone so the index check below can consult
+            # the cache; a failed connection just disables caching.
+            try:
+                self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
+                self.redis_client.ping()
+                logging.info("Redis connection successful.")
+            except redis.exceptions.ConnectionError as e:
+                logging.error(f"Could not connect to Redis: {e}. Caching will be disabled.")
+                self.redis_client = None
 
             # Pinecone
-            self.pinecone_client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-            self.index_name = os.getenv("PINECONE_INDEX_NAME")
+            self.pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+            self.index_name = PINECONE_INDEX_NAME
             self._ensure_pinecone_index()
             self.pinecone_index = self.pinecone_client.Index(self.index_name)
 
             # Neo4j
-            self.neo4j_driver = GraphDatabase.driver(
-                os.getenv("NEO4J_URI"),
-                auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")),
-                database=os.getenv("NEO4J_DATABASE")
+            # Async driver with one shared connection pool; connectivity is
+            # verified by the startup warmup ping once an event loop exists.
+            self.database = NEO4J_DATABASE
+            self.neo4j_driver = AsyncGraphDatabase.driver(
+                NEO4J_URI,
+                auth=(NEO4J_USER, NEO4J_PASSWORD),
+                max_connection_pool_size=50,
+                connection_acquisition_timeout=10,
             )
-            self.neo4j_driver.verify_connectivity()
-
-            # ---Connect to Redis ---
-            self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
-            self.redis_client.ping()
-            logging.info("Redis connection successful.")
 
             logging.info("All clients initialized successfully.")
 
-        except redis.exceptions.ConnectionError as e:
-            logging.error(f"Could not connect to Redis: {e}. Caching will be disabled.")
-            self.redis_client = None
         except (APIError, PineconeException, Neo4jError, TypeError) as e:
             logging.error(f"Failed to initialize clients: {e}")
             raise
 
     def _ensure_pinecone_index(self):
-        """Checks if the Pinecone index exists and creates it if not."""
-        if self.index_name not in self.pinecone_client.list_indexes().names():
+        """Checks if the Pinecone index exists and creates it if not.
+
+        A positive outcome is cached in Redis for a day, so restarting workers
+        skip the control-plane round-trip for a condition that rarely changes.
+        """
+        check_key = f"pinecone:idx:ok:{self.index_name}"
+        if self.redis_client:
+            try:
+                if self.redis_client.get(check_key):
+                    return
+            except redis.exceptions.RedisError as e:
+                logging.error(f"Redis error during index check lookup: {e}")
+
+        if not self.pinecone_client.has_index(self.index_name):
             logging.warning(f"Index '{self.index_name}' not found. Creating a new one.")
             self.pinecone_client.create_index(
                 name=self.index_name,
-                # MODIFIED: Default value updated to match the large model
-                dimension=int(os.getenv("PINECONE_VECTOR_DIM", 3072)),
+                dimension=PINECONE_VECTOR_DIM,
                 metric="cosine",
                 spec={"serverless": {"cloud": "aws", "region": "us-east-1"}}
             )
             logging.info(f"Index '{self.index_name}' created successfully.")
 
-    def embed_text(self, text: str) -> List[float]:
+        if self.redis_client:
+            try:
+                self.redis_client.setex(check_key, 86400, 1)
+            except redis.exceptions.RedisError as e:
+                logging.error(f"Redis error during index check write: {e}")
+
+    async def embed_text(self, text: str) -> List[float]:
         """
         Generate embedding for a text string.
         First, checks Redis cache. If not found, calls API and stores result in Redis.
+        Concurrent cache misses are coalesced into batched API calls.
         """
         # Fallback to no caching if Redis is not available
         if not self.redis_client:
-            resp = self.openai_client.embeddings.create(model=self.embed_model, input=[text])
-            return resp.data[0].embedding
-
-        cache_key = f"embedding:{text}"
+            return await self.embed_batcher.embed(text)
+
+        # Fixed-size key scoped by model and dimension: hashing keeps long
+        # queries from bloating Redis memory, and the prefix avoids stale hits
+        # after a model or dimension switch. The emb3 prefix versions the
+        # quantized+compressed value format.
+        text_hash = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        cache_key = f"emb3:{self.embed_model}:{PINECONE_VECTOR_DIM}:{text_hash}"
         try:
             # 1. Check the cache first
             cached_result = self.redis_client.get(cache_key)
             if cached_result:
                 logging.info("Embedding cache HIT from Redis.")
-                return json.loads(cached_result)
+                return _dequantize_embedding(_zstd_decompressor.decompress(cached_result))
 
             # 2. If not in cache (a "miss"), call the API
             logging.info("Embedding cache MISS. Calling OpenAI API.")
-            resp = self.openai_client.embeddings.create(model=self.embed_model, input=[text])
-            embedding = resp.data[0].embedding
-
-            # 3. Store the new result in Redis for next time (expires in 24 hours)
-            self.redis_client.setex(cache_key, 86400, json.dumps(embedding))
+            embedding = await self.embed_batcher.embed(text)
+
+            # 3. Store the new result in Redis for next time (expires in 24 hours).
+            # int8-quantized then zstd-compressed: ~3KB per vector vs ~60KB as
+            # JSON text, and no parse cost on the way back out.
+            self.redis_client.setex(
+                cache_key,
+                86400,
+                _zstd_compressor.compress(_quantize_embedding(embedding)),
+            )
             return embedding
         except APIError as e:
             logging.error(f"OpenAI API error during embedding: {e}")
             return []
         except redis.exceptions.RedisError as e:
             logging.error(f"Redis error during caching: {e}. Falling back to API call without caching.")
-            resp = self.openai_client.embeddings.create(model=self.embed_model, input=[text])
-            return resp.data[0].embedding
-        
-    def pinecone_query(self, query_text: str, top_k: int = 5) -> List[Dict[str, Any]]:
+            return await self.embed_batcher.embed(text)
+
+    async def pinecone_query(self, query_text: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Query Pinecone index."""
         try:
-            vec = self.embed_text(query_text)
+            vec = await self.embed_text(query_text)
             if not vec:
                 return []
-            res = self.pinecone_index.query(
+            # The Pinecone SDK is synchronous; run it in a worker thread so the
+            # event loop can serve other requests during the round-trip.
+            res = await asyncio.to_thread(
+                self.pinecone_index.query,
                 vector=vec, top_k=top_k, include_metadata=True
             )
             logging.info(f"Pinecone found {len(res['matches'])} matches.")
@@ -119,49 +310,102 @@ class HybridRAG:
             logging.error(f"Pinecone query failed: {e}")
             return []
 
-    def fetch_graph_context(self, node_ids: List[str]) -> List[Dict[str, Any]]:
-        """Fetch neighboring nodes from Neo4j in a single efficient query."""
+    async def fetch_graph_context(self, node_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch neighboring nodes from Neo4j in a single efficient query.
+
+        Results are cached in Redis keyed on the sorted node IDs, so repeat
+        questions that retrieve the same entities skip the Neo4j round-trip.
+        """
         if not node_ids:
             return []
+
+        cache_key = None
+        if self.redis_client:
+            ids_hash = hashlib.blake2b(",".join(sorted(node_ids)).encode("utf-8"), digest_size=16).hexdigest()
+            cache_key = f"graph:{ids_hash}"
+            try:
+                cached_result = self.redis_client.get(cache_key)
+                if cached_result:
+                    logging.info("Graph context cache HIT from Redis.")
+                    return json.loads(cached_result)
+            except redis.exceptions.RedisError as e:
+                logging.error(f"Redis error during graph cache lookup: {e}")
+                cache_key = None
+
+        # A per-source LIMIT keeps one highly connected entity from eating the
+        # whole fact budget; only fields the prompt builder uses are projected.
         cypher_query = """
         UNWIND $node_ids AS nid
-        MATCH (n:Entity {id: nid})-[r]-(m:Entity)
-        RETURN
-          nid AS source_id,
-          type(r) AS relation,
-          m.id AS target_id,
-          m.name AS target_name,
-          COALESCE(left(m.description, 300), "No description available.") AS target_desc,
-          labels(m) AS target_labels
-        LIMIT 20
+        CALL {
+          WITH nid
+          MATCH (n:Entity {id: nid})-[r]-(m:Entity)
+          RETURN
+            type(r) AS relation,
+            m.id AS target_id,
+            m.name AS target_name,
+            COALESCE(left(m.description, 300), "No description available.") AS target_desc
+          LIMIT 4
+        }
+        RETURN nid AS source_id, relation, target_id, target_name, target_desc
         """
         try:
-            with self.neo4j_driver.session() as session:
-                result = session.run(cypher_query, node_ids=node_ids)
-                facts = [record.data() for record in result]
-                logging.info(f"Neo4j found {len(facts)} graph facts.")
-                return facts
+            # execute_query reuses the driver's shared connection pool, so no
+            # per-call session lifecycle is paid here.
+            records, _, _ = await self.neo4j_driver.execute_query(
+                cypher_query, node_ids=node_ids, database_=self.database
+            )
+            facts = [record.data() for record in records]
+            logging.info(f"Neo4j found {len(facts)} graph facts.")
+            if cache_key:
+                try:
+                    self.redis_client.setex(cache_key, 3600, json.dumps(facts))
+                except redis.exceptions.RedisError as e:
+                    logging.error(f"Redis error during graph cache write: {e}")
+            return facts
         except Neo4jError as e:
             logging.error(f"Neo4j query failed: {e}")
             return []
 
-    def _get_search_summary(self, query: str, pinecone_matches: list, graph_facts: list) -> str:
-        """Summarizes retrieved context using an LLM call."""
+    def _format_context(self, pinecone_matches: list, graph_facts: list) -> str:
+        """Formats the retrieved matches and graph facts into a compact text block."""
         if not pinecone_matches and not graph_facts:
             return "No relevant information was found in the knowledge base."
 
-        # Combine the retrieved info into a single text block
-        summary_context = "### Pinecone Semantic Search Results:\n"
+        # Combine the retrieved info into a single text block. Building the
+        # parts in a list and joining once avoids reallocating the growing
+        # string on every line.
+        parts = ["### Pinecone Semantic Search Results:\n"]
         for match in pinecone_matches:
             meta = match.get('metadata', {})
-            summary_context += f"- ID: {meta.get('id', 'N/A')}, Name: {meta.get('name', 'N/A')}, Type: {meta.get('type', 'N/A')}\n"
-        
-        summary_context += "\n### Neo4j Graph Facts:\n"
+            parts.append(f"- ID: {meta.get('id', 'N/A')}, Name: {meta.get('name', 'N/A')}, Type: {meta.get('type', 'N/A')}\n")
+
+        parts.append("\n### Neo4j Graph Facts:\n")
         for fact in graph_facts:
-            summary_context += f"- The entity `{fact['source_id']}` has a `{fact['relation']}` relation with `{fact['target_name']}` (`{fact['target_id']}`).\n"
-        
+            parts.append(f"- The entity `{fact['source_id']}` has a `{fact['relation']}` relation with `{fact['target_name']}` (`{fact['target_id']}`).\n")
+
+        return "".join(parts)
+
+    async def _get_search_summary(self, query: str, summary_context: str) -> str:
+        """Condenses an oversized retrieved context using an LLM call.
+
+        Summaries are cached in Redis keyed on (query, context), so re-asked
+        questions with an identical retrieval set skip the LLM call entirely.
+        """
+        cache_key = None
+        if self.redis_client:
+            sum_hash = hashlib.blake2b(f"{query}|{summary_context}".encode("utf-8"), digest_size=16).hexdigest()
+            cache_key = f"sum:{sum_hash}"
+            try:
+                cached_result = self.redis_client.get(cache_key)
+                if cached_result:
+                    logging.info("Summary cache HIT from Redis.")
+                    return cached_result.decode("utf-8")
+            except redis.exceptions.RedisError as e:
+                logging.error(f"Redis error during summary cache lookup: {e}")
+                cache_key = None
+
         try:
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a highly skilled summarization assistant. Your task is to synthesize the provided search results into a concise, single paragraph. Focus only on the information that is most relevant to answering the user's query."},
@@ -171,99 +415,79 @@ class HybridRAG:
             )
             summary = response.choices[0].message.content
             logging.info(f"Generated search summary: {summary}")
+            if cache_key:
+                try:
+                    self.redis_client.setex(cache_key, 3600, summary)
+                except redis.exceptions.RedisError as e:
+                    logging.error(f"Redis error during summary cache write: {e}")
             return summary
         except APIError as e:
             logging.error(f"Failed to generate search summary: {e}")
             return "Error: Could not generate a summary of the search results."
 
     def build_prompt_with_summary(self, user_query: str, summary: str, history: list) -> list:
-        """Builds the final prompt using the pre-generated summary."""
-        system_content = system_content = system_content = """You are 'VietBot', a meticulous and expert AI travel planner for Vietnam. Your task is to follow a strict reasoning process to provide the most accurate and helpful answer possible, based **exclusively** on the provided context.
-
-### Step 1: Internal Thought Process
-
-First, you must reason through the user's request by completing the following steps inside `<thinking>` tags. This is your private workspace.
-
-<thinking>
-**1. User's Goal:** [Identify the user's primary intent in one clear sentence.]
-**2. Key Information & Constraints:** [Extract all key entities, locations, durations, preferences (e.g., 'romantic'), or other constraints from the user's query.]
-**3. Context Analysis:** [Analyze the provided 'CONTEXT SUMMARY'. List the specific pieces of information that directly address the user's goal and constraints.]
-**4. Sufficiency Check:** [Based on the analysis, explicitly state whether the context is sufficient to fully answer the query. If not, identify exactly what information is missing.]
-**5. Plan:** [Based on the available information, outline a clear, step-by-step plan for constructing the final answer.]
-</thinking>
-
-### Step 2: Final Answer to the User
-
-After your thought process, provide the final answer to the user inside `<answer>` tags.
-
-### Rules for the Final Answer:
--   The answer must be based **only** on your 'Plan' from the `<thinking>` block.
--   If the context was insufficient, state clearly what you can answer and what information you couldn't find. **Do not make up information.**
--   Do not mention your thought process or the context summary in the final answer. Speak directly to the user.
--   Format the answer for clarity using Markdown (lists, bold text).
--   Cite sources by including the node ID in parentheses, like `Hoi An (town_hoi_an)`.
--   Maintain a friendly, expert tone.
-"""
-
-        context_str = f"## CONTEXT SUMMARY\n\n{summary}"
-        user_content = f"{context_str}\n\n## QUERY\n\n{user_query}"
+        """Builds the final prompt from the retrieved context (raw or summarized)."""
+        user_content = f"## CONTEXT SUMMARY\n\n{summary}\n\n## QUERY\n\n{user_query}"
 
         # Combine system message, conversation history, and the final user query with context
-        full_prompt = [{"role": "system", "content": system_content}]
-        if history:
-            full_prompt.extend(history)
-        full_prompt.append({"role": "user", "content": user_content})
-        
-        return full_prompt
+        return [_SYSTEM_MESSAGE, *(history or []), {"role": "user", "content": user_content}]
     
-    def get_answer(self, query: str, history: List[Dict[str, str]] = None) -> Generator[str, None, None]:
+    async def get_answer(self, query: str, history: List[Dict[str, str]] = None) -> AsyncGenerator[str, None]:
         """
-        Main method to get an answer, with print statements for debugging each step.
+        Main method to get an answer. Each pipeline step is logged at DEBUG
+        level, so per-request tracing costs nothing in normal operation.
         """
         history = history or []
-        
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
         # --- STEP 1: RETRIEVE from Pinecone ---
-        matches = self.pinecone_query(query, top_k=5)
+        matches = await self.pinecone_query(query, top_k=5)
         match_ids = [m["id"] for m in matches]
-        
-        print("\n\n--- [STEP 1] IDs from Pinecone ---")
-        print(match_ids)
-        print("----------------------------------\n")
+
+        if debug:
+            logging.debug(f"[STEP 1] IDs from Pinecone: {match_ids}")
 
         # --- STEP 2: RETRIEVE from Neo4j ---
-        graph_facts = self.fetch_graph_context(match_ids)
-        
-        print("\n--- [STEP 2] Context from Neo4j Graph ---")
-        print(json.dumps(graph_facts, indent=2))
-        print("-----------------------------------------\n")
-
-        # --- STEP 3: SUMMARIZE the context ---
-        summary = self._get_search_summary(query, matches, graph_facts)
-        
-        print("\n--- [STEP 3] Generated Search Summary ---")
-        print(summary)
-        print("-----------------------------------------\n")
+        graph_facts = await self.fetch_graph_context(match_ids)
+
+        if debug:
+            logging.debug(f"[STEP 2] Context from Neo4j graph:\n{json.dumps(graph_facts, indent=2)}")
+
+        # --- STEP 3: FORMAT the context (summarize only if oversized) ---
+        # Feeding the compact raw context straight to the answer model skips a
+        # whole LLM round-trip; the summarizer only runs for oversized contexts.
+        summary = self._format_context(matches, graph_facts)
+        if len(summary) > SUMMARY_CHAR_THRESHOLD:
+            summary = await self._get_search_summary(query, summary)
+
+        if debug:
+            logging.debug(f"[STEP 3] Retrieved context for prompt:\n{summary}")
 
         # --- STEP 4: BUILD the final prompt ---
         prompt_messages = self.build_prompt_with_summary(query, summary, history)
-        
-        print("\n--- [STEP 4] Final Prompt to LLM ---")
-        print(json.dumps(prompt_messages, indent=2))
-        print("------------------------------------\n")
+
+        if debug:
+            logging.debug(f"[STEP 4] Final prompt to LLM:\n{json.dumps(prompt_messages, indent=2)}")
 
         # --- STEP 5: GENERATE the final answer ---
-        print("\n--- [STEP 5] Streaming Assistant Answer ---\n")
-        stream = self.openai_client.chat.completions.create(
+        stream = await self.openai_client.chat.completions.create(
             model=self.chat_model,
             messages=prompt_messages,
             stream=True
         )
-        for chunk in stream:
+        async for chunk in stream:
             content = chunk.choices[0].delta.content or ""
             yield content
 
+    async def close(self):
+        """Closes the Neo4j driver and releases client resources."""
+        await self.neo4j_driver.close()
+        await self.openai_client.close()
+        if self.redis_client:
+            self.redis_client.close()
+
 
-def main():
+async def main():
     """Run an interactive chat session."""
     try:
         rag_system = HybridRAG()
@@ -275,14 +499,14 @@ def main():
             if query.lower() in ("exit", "quit"):
                 break
             print("\n=== Assistant Answer ===\n")
-            for chunk in rag_system.get_answer(query):
+            async for chunk in rag_system.get_answer(query):
                 print(chunk, end="", flush=True)
             print("\n\n========================\n")
 
-        rag_system.close()
+        await rag_system.close()
     except Exception as e:
         logging.critical(f"A critical error occurred: {e}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -1,6 +1,8 @@
 import os
-import json
 import logging
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import ijson
 from tqdm import tqdm
 from neo4j import GraphDatabase
 from neo4j.exceptions import Neo4jError
@@ -21,9 +23,15 @@ class Neo4jLoader:
         self.database = database
         self.data_file = data_file
         self.batch_size = 500
+        self.rel_chunk_size = 100_000
+        self.max_workers = 8
 
         try:
-            self.driver = GraphDatabase.driver(uri, auth=(user, password), database=database)
+            # Pool sized for the worker threads; the target database is passed
+            # per query/session rather than on the driver.
+            self.driver = GraphDatabase.driver(
+                uri, auth=(user, password), max_connection_pool_size=16
+            )
             self.driver.verify_connectivity()
             logging.info(f"Neo4j connection to database '{self.database}' successful.")
         except (Neo4jError, ValueError) as e:
@@ -36,14 +44,17 @@ class Neo4jLoader:
             self.driver.close()
             logging.info("Neo4j connection closed.")
 
-    def _load_json_data(self):
-        """Loads and returns the data from the source JSON file."""
+    def _iter_json_nodes(self):
+        """Streams node records from the source JSON file one at a time.
+
+        Keeps peak memory at O(batch_size) regardless of file size and lets
+        the first batch start writing while the rest is still being parsed.
+        """
         try:
-            with open(self.data_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (IOError, json.JSONDecodeError) as e:
+            with open(self.data_file, "rb") as f:
+                yield from ijson.items(f, "item")
+        except (IOError, ijson.JSONError) as e:
             logging.error(f"Could not read or parse data file {self.data_file}: {e}")
-            return []
 
     def _run_write_transaction(self, query, params=None):
         """Executes a write transaction against the specified database."""
@@ -53,69 +64,137 @@ class Neo4jLoader:
             except Neo4jError as e:
                 logging.error(f"Cypher query failed: {e}\nQuery: {query}")
 
+    def _run_batches_parallel(self, batches, desc):
+        """Fans batch writes out over a thread pool sharing the driver's connection pool.
+
+        `batches` is an iterable of (query, batch) pairs, and may be a generator
+        fed by the JSON stream; at most 2 * max_workers batches are held in
+        flight so memory stays bounded. execute_query uses managed transactions,
+        so transient failures (including lock conflicts between concurrent
+        batches) are retried automatically.
+        """
+        def reap(completed, progress):
+            for future in completed:
+                try:
+                    future.result()
+                except Neo4jError as e:
+                    logging.error(f"Batch write failed: {e}")
+                progress.update(1)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                tqdm(desc=desc, unit="batch") as progress:
+            in_flight = set()
+            for query, batch in batches:
+                in_flight.add(executor.submit(
+                    self.driver.execute_query, query, batch=batch, database_=self.database
+                ))
+                if len(in_flight) >= self.max_workers * 2:
+                    completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    reap(completed, progress)
+            completed, _ = wait(in_flight)
+            reap(completed, progress)
+
     def create_constraints(self):
         """Ensures an `id` uniqueness constraint exists for `Entity` nodes."""
         logging.info("Applying uniqueness constraint for :Entity(id)...")
         query = "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Entity) REQUIRE n.id IS UNIQUE"
         self._run_write_transaction(query)
 
-    def batch_upsert_nodes(self, nodes):
-        """Upserts nodes into Neo4j in batches using UNWIND."""
-        logging.info(f"Upserting {len(nodes)} nodes in batches...")
-        query = """
-        UNWIND $batch as node_data
-        MERGE (n:Entity {id: node_data.id})
-        SET n += apoc.map.removeKey(node_data.props, 'id')
-        WITH n, node_data
-        CALL apoc.create.addLabels(n, [node_data.type]) YIELD node
-        RETURN count(node)
+    @staticmethod
+    def _node_upsert_query(label):
+        """Builds a type-specialized upsert query with a static label.
+
+        Baking the label into the MERGE lets the planner hit the :Entity(id)
+        constraint index directly and removes the second APOC labelling pass.
         """
-        for i in tqdm(range(0, len(nodes), self.batch_size), desc="Upserting Nodes"):
-            batch = nodes[i:i + self.batch_size]
-            batch_data = [
-                {
+        return (
+            "UNWIND $batch as node_data\n"
+            f"MERGE (n:Entity:`{label}` {{id: node_data.id}})\n"
+            "SET n += node_data.props"
+        )
+
+    def batch_upsert_nodes(self, nodes):
+        """Upserts a stream of nodes into Neo4j, batched per node type."""
+        logging.info("Upserting nodes in batches...")
+
+        def batches():
+            grouped = defaultdict(list)
+            for node in nodes:
+                label = (node.get("type") or "Unknown").replace("`", "")
+                grouped[label].append({
                     "id": node["id"],
-                    "type": node.get("type", "Unknown"),
-                    "props": {k: v for k, v in node.items() if k != "connections"}
-                } for node in batch
-            ]
-            self._run_write_transaction(query, params={"batch": batch_data})
+                    "props": {k: v for k, v in node.items() if k not in ("id", "connections")}
+                })
+                if len(grouped[label]) >= self.batch_size:
+                    yield self._node_upsert_query(label), grouped[label]
+                    grouped[label] = []
+            for label, batch_data in grouped.items():
+                if batch_data:
+                    yield self._node_upsert_query(label), batch_data
+
+        self._run_batches_parallel(batches(), desc="Upserting Nodes")
 
     def batch_create_relationships(self, nodes):
-        """Creates relationships in batches from the node connection data."""
-        logging.info("Creating relationships in batches...")
-        all_relationships = []
+        """Creates relationships server-side with apoc.periodic.iterate.
+
+        Relationships are shipped in large chunks and APOC splits each chunk
+        into parallel server-side batches, so the client pays one round-trip
+        per ~100k relationships instead of one per 500. Lock conflicts between
+        parallel batches are retried by APOC itself.
+        """
+        logging.info("Creating relationships via apoc.periodic.iterate...")
+        query = """
+        CALL apoc.periodic.iterate(
+          "UNWIND $rels AS rel_data RETURN rel_data",
+          "MATCH (a:Entity {id: rel_data.source})
+           MATCH (b:Entity {id: rel_data.target})
+           CALL apoc.create.relationship(a, rel_data.type, {}, b) YIELD rel
+           RETURN rel",
+          {batchSize: 1000, parallel: true, retries: 3, params: {rels: $rels}}
+        )
+        """
+
+        def flush(chunk):
+            try:
+                # apoc.periodic.iterate reports inner-statement failures in
+                # its result row instead of raising, so check the stats.
+                records, _, _ = self.driver.execute_query(
+                    query, rels=chunk, database_=self.database
+                )
+                stats = records[0]
+                if stats["failedBatches"]:
+                    logging.error(
+                        f"{stats['failedBatches']} of {stats['batches']} relationship batches "
+                        f"failed after APOC retries: {stats['errorMessages']}"
+                    )
+                else:
+                    logging.info(f"Created relationships for a chunk of {len(chunk)}.")
+            except Neo4jError as e:
+                logging.error(f"Relationship chunk of {len(chunk)} failed: {e}")
+
+        chunk = []
         for node in nodes:
             source_id = node["id"]
             for conn in node.get("connections", []):
                 if "target" in conn and "relation" in conn:
-                    all_relationships.append({
+                    chunk.append({
                         "source": source_id,
                         "target": conn["target"],
                         "type": conn["relation"]
                     })
-
-        query = """
-        UNWIND $batch as rel_data
-        MATCH (a:Entity {id: rel_data.source})
-        MATCH (b:Entity {id: rel_data.target})
-        CALL apoc.create.relationship(a, rel_data.type, {}, b) YIELD rel
-        RETURN count(rel)
-        """
-        for i in tqdm(range(0, len(all_relationships), self.batch_size), desc="Creating Relationships"):
-            batch = all_relationships[i:i + self.batch_size]
-            self._run_write_transaction(query, params={"batch": batch})
+                    if len(chunk) >= self.rel_chunk_size:
+                        flush(chunk)
+                        chunk = []
+        if chunk:
+            flush(chunk)
 
     def run(self):
         """Executes the full data loading pipeline."""
         self.create_constraints()
-        nodes_data = self._load_json_data()
-        if not nodes_data:
-            logging.warning("No data found to load. Exiting.")
-            return
-
-        self.batch_upsert_nodes(nodes_data)
-        self.batch_create_relationships(nodes_data)
+        # Two streaming passes over the file: nodes first so every relationship
+        # endpoint exists, then connections. Neither pass holds the dataset in RAM.
+        self.batch_upsert_nodes(self._iter_json_nodes())
+        self.batch_create_relationships(self._iter_json_nodes())
         logging.info("Data loading process completed successfully.")
 
 
@@ -1,18 +1,50 @@
 # main.py
+import asyncio
 import logging
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from hybrid_chat import HybridRAG
 
+
+# --- Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Constructs the RAG system once per worker and pre-warms the OpenAI,
+    Pinecone, and Neo4j connections. The warmup calls run concurrently, so
+    cold start costs the slowest backend rather than the sum of all three.
+    """
+    rag_system = HybridRAG()
+    app.state.rag = rag_system
+
+    results = await asyncio.gather(
+        rag_system.openai_client.models.list(),
+        asyncio.to_thread(rag_system.pinecone_index.describe_index_stats),
+        rag_system.neo4j_driver.execute_query("RETURN 1", database_=rag_system.database),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            # A failed warmup just means the first request pays the handshake.
+            logging.warning(f"Connection warmup failed: {result}")
+    logging.info("Connection warmup complete.")
+
+    yield
+
+    logging.info("Closing Neo4j driver...")
+    await rag_system.close()
+
+
 # --- App Initialization ---
 app = FastAPI(
     title="AI Hybrid Chat API",
     description="API for the hybrid RAG chatbot using Pinecone, Neo4j, and OpenAI.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
-rag_system = HybridRAG()
 
 # --- CORS Middleware ---
 app.add_middleware(
@@ -26,25 +58,19 @@ app.add_middleware(
 # --- Pydantic Models ---
 class ChatRequest(BaseModel):
     query: str
-    
+
 
 # --- API Endpoints ---
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """
     Receives a user's query and returns a streaming response from the RAG system.
     """
     try:
         return StreamingResponse(
-            rag_system.get_answer(request.query),
+            http_request.app.state.rag.get_answer(request.query),
             media_type="text/event-stream"
         )
     except Exception as e:
         logging.error(f"Error in chat endpoint: {e}")
         return {"error": "An error occurred while processing your request."}
-
-@app.on_event("shutdown")
-def shutdown_event():
-    """Gracefully close the Neo4j driver on shutdown."""
-    logging.info("Closing Neo4j driver...")
-    rag_system.close()
\ No newline at end of file